@@ -1,13 +1,19 @@
 import os
 import sys
+import shutil
 import argparse
-import duckdb
 from pathlib import Path
 from grants_db_common import (
+    DEFAULT_CSV_BUFFER_SIZE,
+    connect_to_database,
+    create_grants_schema,
+    export_grants_parquet,
     create_metadata_table,
+    create_funder_summary,
     create_indexes,
     save_metadata,
     get_database_statistics,
+    save_database_statistics,
     format_statistics_output
 )
 
@@ -24,8 +30,14 @@ Examples:
   # Build with verbose output:
   %(prog)s --grants-csv grants.csv --db-output grants.db --verbose
   
-  # Build with custom chunk size:
-  %(prog)s --grants-csv grants.csv --db-output grants.db --chunk-size 50000
+  # Build with a larger CSV reader buffer (64 MB):
+  %(prog)s --grants-csv grants.csv --db-output grants.db --csv-buffer-size 67108864
+  
+  # Store grants as a Parquet dataset (grants.parquet/) behind the database:
+  %(prog)s --grants-csv grants.csv --db-output grants.db --format parquet
+  
+  # Build a large CSV with bounded memory, spilling to a scratch disk:
+  %(prog)s --grants-csv grants.csv --db-output grants.db --memory-limit 16GB --temp-dir /scratch/duckdb
         """
     )
 
@@ -33,36 +45,74 @@ Examples:
                         help='Path to grants.csv file')
     parser.add_argument('-d', '--db-output', default='grants.db',
                         help='Output database file path (default: grants.db)')
-    parser.add_argument('-c', '--chunk-size', type=int, default=100000,
-                        help='Chunk size for reading CSV (default: 100000)')
+    parser.add_argument('-b', '--csv-buffer-size', type=int, default=DEFAULT_CSV_BUFFER_SIZE,
+                        help='CSV reader buffer size in bytes (default: %(default)s)')
     parser.add_argument('-v', '--verbose',
                         action='store_true', help='Verbose output')
     parser.add_argument('-f', '--force', action='store_true',
-                        help='Force overwrite existing database')
+                        help='Overwrite an existing database (otherwise the build refuses to run)')
+    parser.add_argument('-t', '--threads', type=int, default=os.cpu_count(),
+                        help='Number of DuckDB worker threads (default: CPU count)')
+    parser.add_argument('-m', '--memory-limit',
+                        help='DuckDB memory limit, e.g. 16GB (default: DuckDB default)')
+    parser.add_argument('--temp-dir',
+                        help='Directory DuckDB spills to when the load exceeds the memory limit')
+    parser.add_argument('--format', choices=['duckdb', 'parquet'], default='duckdb',
+                        help='Storage for the grants table: a native DuckDB table, or a '
+                             'Parquet dataset next to the database exposed as a view '
+                             '(default: duckdb)')
+    parser.add_argument('--assume-normalized-doi', action='store_true',
+                        help='Skip lowercasing/trimming DOIs on load (input DOIs are '
+                             'already normalized)')
+    parser.add_argument('--drop-unparsed', action='store_true',
+                        help='Do not store rows without a parsable funder (the dropped '
+                             'count is recorded in the database metadata)')
+    parser.add_argument('--with-indexes', action='store_true',
+                        help='Also create funder, award and (funder, doi) indexes '
+                             '(default: DOI index only)')
 
     return parser.parse_args()
 
 
-def build_database(grants_csv_path, db_path, chunk_size=100000, verbose=False, force=False):
+def build_database(grants_csv_path, db_path, csv_buffer_size=DEFAULT_CSV_BUFFER_SIZE, verbose=False, force=False,
+                   with_indexes=False, threads=None, memory_limit=None, temp_dir=None,
+                   output_format='duckdb', assume_normalized_doi=False, drop_unparsed=False):
     if not os.path.exists(grants_csv_path):
         print(f"Error: Input file not found: {grants_csv_path}")
-        return False
+        return None
 
     if os.path.exists(db_path):
         if not force:
-            response = input(f"Database {db_path} already exists. Overwrite? (y/n): ")
-            if response.lower() != 'y':
-                print("Operation cancelled.")
-                return False
+            print(f"Error: Database {db_path} already exists (use --force to overwrite)")
+            return None
         print(f"Removing existing database: {db_path}")
         os.remove(db_path)
 
+    parquet_dir = Path(db_path).with_suffix('.parquet') if output_format == 'parquet' else None
+    if parquet_dir is not None and parquet_dir.exists():
+        if not force:
+            print(f"Error: Parquet dataset {parquet_dir} already exists (use --force to overwrite)")
+            return None
+        print(f"Removing existing Parquet dataset: {parquet_dir}")
+        shutil.rmtree(parquet_dir)
+
     print(f"Building database from {grants_csv_path}")
     print(f"Output database: {db_path}")
-
-    conn = duckdb.connect(db_path)
-
+    if parquet_dir is not None:
+        print(f"Parquet dataset: {parquet_dir}")
+
+    config = {'preserve_insertion_order': 'false'}
+    if threads:
+        config['threads'] = str(threads)
+    if memory_limit:
+        config['memory_limit'] = memory_limit
+    if temp_dir:
+        config['temp_directory'] = temp_dir
+
+    conn = None
     try:
+        conn = connect_to_database(db_path, config=config)
+
         if verbose:
             conn.execute("SET enable_progress_bar = true")
 
@@ -70,65 +120,70 @@ def build_database(grants_csv_path, db_path, chunk_size=100000, verbose=False, f
 
         print("Loading and processing grants CSV file with DuckDB...")
 
-        conn.execute("""
-            CREATE TABLE grants AS
-            SELECT 
-                work_id,
-                LOWER(TRIM(doi)) as doi,
-                field_name,
-                subfield_path,
-                TRY_CAST(json_extract_string(value, '$.funder') AS VARCHAR) as funder,
-                TRY_CAST(json_extract_string(value, '$.award_id') AS VARCHAR) as award_id,
-                source_id,
-                doi_prefix,
-                source_file_path
-            FROM read_csv(?, 
-                auto_detect=true,
-                parallel=true,
-                sample_size=100000)
-        """, [grants_csv_path])
-
-        total_rows = conn.execute("SELECT COUNT(*) FROM grants").fetchone()[0]
-        parsed_rows = conn.execute(
-            "SELECT COUNT(*) FROM grants WHERE funder IS NOT NULL").fetchone()[0]
+        if parquet_dir is not None:
+            dropped_rows = export_grants_parquet(conn, grants_csv_path, parquet_dir, csv_buffer_size,
+                                                 normalize_doi=not assume_normalized_doi,
+                                                 drop_unparsed=drop_unparsed)
+        else:
+            dropped_rows = create_grants_schema(conn, grants_csv_path, csv_buffer_size,
+                                                normalize_doi=not assume_normalized_doi,
+                                                drop_unparsed=drop_unparsed)
+
+        total_rows, parsed_rows = conn.execute("""
+            SELECT COUNT(*), COUNT(*) FILTER (WHERE funder IS NOT NULL)
+            FROM grants
+        """).fetchone()
+
+        if dropped_rows is not None:
+            total_rows += dropped_rows
 
         print(f"Loaded {total_rows:,} total rows")
         print(f"Parsed {parsed_rows:,} rows with valid funder information")
+        if dropped_rows is not None:
+            print(f"Dropped {dropped_rows:,} rows without a parsable funder")
+
+        print("Summarizing grants by funder...")
+        create_funder_summary(conn)
 
-        create_indexes(conn)
+        if parquet_dir is None:
+            create_indexes(conn, all_indexes=with_indexes, parallel=threads != 1)
 
-        save_metadata(conn, grants_csv_path, total_rows, parsed_rows)
+        save_metadata(conn, grants_csv_path, total_rows, parsed_rows, dropped_rows)
 
-        stats = get_database_statistics(conn)
+        stats = get_database_statistics(conn, use_cache=False)
+        save_database_statistics(conn, stats)
         print(format_statistics_output(stats))
 
         conn.commit()
+        conn.execute("CHECKPOINT")
 
         print(f"\n✓ Database built successfully: {db_path}")
         print(f"  File size: {os.path.getsize(db_path) / (1024*1024):.2f} MB")
 
-        return True
+        return conn
 
     except Exception as e:
         print(f"\n✗ Error building database: {e}")
         if verbose:
             import traceback
             traceback.print_exc()
-        return False
-    finally:
-        conn.close()
-
+        if conn is not None:
+            conn.close()
+        return None
 
-def verify_database(db_path, verbose=False):
-    if not os.path.exists(db_path):
-        print(f"Error: Database file not found: {db_path}")
-        return False
 
+def verify_database(conn, verbose=False):
     try:
-        conn = duckdb.connect(db_path, read_only=True)
-
-        tables = conn.execute("SHOW TABLES").fetchall()
-        table_names = [t[0] for t in tables]
+        tables = dict(conn.execute("""
+            SELECT table_name, estimated_size
+            FROM duckdb_tables()
+            WHERE table_name IN ('grants', 'db_metadata')
+            UNION ALL
+            SELECT view_name, NULL
+            FROM duckdb_views()
+            WHERE view_name = 'grants' AND NOT internal
+        """).fetchall())
+        table_names = list(tables)
 
         required_tables = ['grants', 'db_metadata']
         for table in required_tables:
@@ -136,7 +191,10 @@ def verify_database(db_path, verbose=False):
                 print(f"Error: Required table '{table}' not found in database")
                 return False
 
-        count = conn.execute("SELECT COUNT(*) FROM grants").fetchone()[0]
+        count = tables['grants']
+        if count is None:
+            # Parquet-backed view: the count comes from the file footers
+            count = conn.execute("SELECT COUNT(*) FROM grants").fetchone()[0]
         if count == 0:
             print("Warning: Grants table is empty")
             return False
@@ -146,7 +204,6 @@ def verify_database(db_path, verbose=False):
             print(f"  Tables: {', '.join(table_names)}")
             print(f"  Grants records: {count:,}")
 
-        conn.close()
         return True
 
     except Exception as e:
@@ -156,18 +213,27 @@ def verify_database(db_path, verbose=False):
 
 def main():
     args = parse_arguments()
-    success = build_database(
+    conn = build_database(
         args.grants_csv,
         args.db_output,
-        args.chunk_size,
+        args.csv_buffer_size,
         args.verbose,
-        args.force
+        args.force,
+        args.with_indexes,
+        args.threads,
+        args.memory_limit,
+        args.temp_dir,
+        args.format,
+        args.assume_normalized_doi,
+        args.drop_unparsed
     )
-    if success:
-        if not verify_database(args.db_output, args.verbose):
-            return 1
+    if conn is None:
+        return 1
 
-    return 0 if success else 1
+    try:
+        return 0 if verify_database(conn, args.verbose) else 1
+    finally:
+        conn.close()
 
 
 if __name__ == "__main__":
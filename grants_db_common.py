@@ -1,27 +1,133 @@
+import json
 import duckdb
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
 
-def connect_to_database(db_path, read_only=False):
-    return duckdb.connect(db_path, read_only=read_only)
+DEFAULT_CSV_BUFFER_SIZE = 32 * 1024 * 1024
 
 
-def create_grants_schema(conn):
-    conn.execute("""
-        CREATE TABLE grants AS
+def connect_to_database(db_path, read_only=False, config=None):
+    return duckdb.connect(db_path, read_only=read_only, config=config or {})
+
+
+def sql_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def sql_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+GRANTS_CSV_SOURCE = """read_csv(?, 
+                header=true,
+                delim=',',
+                quote='"',
+                escape='"',
+                columns={
+                    'work_id': 'VARCHAR',
+                    'doi': 'VARCHAR',
+                    'field_name': 'VARCHAR',
+                    'subfield_path': 'VARCHAR',
+                    'value': 'VARCHAR',
+                    'source_id': 'VARCHAR',
+                    'doi_prefix': 'VARCHAR',
+                    'source_file_path': 'VARCHAR'
+                },
+                parallel=true,
+                buffer_size=?)"""
+
+
+def grants_select_sql(normalize_doi=True, ordered=True):
+    doi_expr = "NULLIF(LOWER(TRIM(doi)), '')" if normalize_doi else "NULLIF(doi, '')"
+    order_clause = "ORDER BY funder, doi" if ordered else ""
+    return f"""
         SELECT 
             work_id,
-            LOWER(TRIM(doi)) as doi,
+            {doi_expr} as doi,
             field_name,
             subfield_path,
-            TRY_CAST(json_extract_string(value, '$.funder') AS VARCHAR) as funder,
-            TRY_CAST(json_extract_string(value, '$.award_id') AS VARCHAR) as award_id,
+            grant_value.funder as funder,
+            grant_value.award_id as award_id,
             source_id,
             doi_prefix,
             source_file_path
-        FROM (SELECT * FROM '__temp_csv_data')
+        FROM (
+            SELECT 
+                *,
+                json_transform(value, '{{"funder": "VARCHAR", "award_id": "VARCHAR"}}') as grant_value
+            FROM {GRANTS_CSV_SOURCE}
+        )
+        {order_clause}
+    """
+
+
+STAGED_GRANTS_SELECT_SQL = """
+    SELECT * FROM grants_staged
+    WHERE funder IS NOT NULL
+    ORDER BY funder, doi
+"""
+
+
+def stage_grants(conn, grants_csv_path, csv_buffer_size=DEFAULT_CSV_BUFFER_SIZE, normalize_doi=True):
+    # Parse the CSV once into a temp table so the unparsed rows can be counted
+    # without reading the file a second time
+    conn.execute(f"CREATE TEMP TABLE grants_staged AS {grants_select_sql(normalize_doi, ordered=False)}",
+                 [grants_csv_path, csv_buffer_size])
+    return conn.execute(
+        "SELECT COUNT(*) FILTER (WHERE funder IS NULL) FROM grants_staged").fetchone()[0]
+
+
+def create_grants_schema(conn, grants_csv_path, csv_buffer_size=DEFAULT_CSV_BUFFER_SIZE,
+                         normalize_doi=True, drop_unparsed=False):
+    if not drop_unparsed:
+        conn.execute(f"CREATE TABLE grants AS {grants_select_sql(normalize_doi)}",
+                     [grants_csv_path, csv_buffer_size])
+        return None
+
+    dropped_rows = stage_grants(conn, grants_csv_path, csv_buffer_size, normalize_doi)
+    conn.execute(f"CREATE TABLE grants AS {STAGED_GRANTS_SELECT_SQL}")
+    conn.execute("DROP TABLE grants_staged")
+    return dropped_rows
+
+
+def export_grants_parquet(conn, grants_csv_path, parquet_dir,
+                          csv_buffer_size=DEFAULT_CSV_BUFFER_SIZE, normalize_doi=True,
+                          drop_unparsed=False):
+    parquet_dir = Path(parquet_dir).resolve()
+    copy_options = """(
+            FORMAT PARQUET,
+            COMPRESSION ZSTD,
+            ROW_GROUP_SIZE 122880,
+            PARTITION_BY (doi_prefix)
+        )"""
+    dropped_rows = None
+    if drop_unparsed:
+        dropped_rows = stage_grants(conn, grants_csv_path, csv_buffer_size, normalize_doi)
+        conn.execute(f"COPY ({STAGED_GRANTS_SELECT_SQL}) TO {sql_literal(parquet_dir)} {copy_options}")
+        conn.execute("DROP TABLE grants_staged")
+    else:
+        conn.execute(f"COPY ({grants_select_sql(normalize_doi)}) TO {sql_literal(parquet_dir)} {copy_options}",
+                     [grants_csv_path, csv_buffer_size])
+
+    conn.execute(f"""
+        CREATE VIEW grants AS
+        SELECT 
+            work_id,
+            doi,
+            field_name,
+            subfield_path,
+            funder,
+            award_id,
+            source_id,
+            doi_prefix,
+            source_file_path
+        FROM read_parquet({sql_literal(parquet_dir / '**' / '*.parquet')},
+            hive_partitioning=true,
+            hive_types={{'doi_prefix': 'VARCHAR'}})
     """)
+    return dropped_rows
 
 
 def create_metadata_table(conn):
@@ -34,58 +140,142 @@ def create_metadata_table(conn):
     """)
 
 
-def create_indexes(conn):
+def create_indexes(conn, all_indexes=False, parallel=True):
     print("Creating indexes...")
-    conn.execute("CREATE INDEX idx_grants_doi ON grants(doi)")
-    conn.execute("CREATE INDEX idx_grants_funder ON grants(funder)")
-    conn.execute("CREATE INDEX idx_grants_award ON grants(award_id)")
-    conn.execute("CREATE INDEX idx_grants_funder_doi ON grants(funder, doi)")
+    statements = ["CREATE INDEX idx_grants_doi ON grants(doi)"]
+    if all_indexes:
+        statements += [
+            "CREATE INDEX idx_grants_funder ON grants(funder)",
+            "CREATE INDEX idx_grants_award ON grants(award_id)",
+            "CREATE INDEX idx_grants_funder_doi ON grants(funder, doi)",
+        ]
 
+    if not parallel or len(statements) == 1:
+        for statement in statements:
+            conn.execute(statement)
+        return
 
-def save_metadata(conn, grants_csv_path, total_rows, parsed_rows):
-    conn.execute("""
+    def create_index(statement):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    with ThreadPoolExecutor(max_workers=len(statements)) as executor:
+        list(executor.map(create_index, statements))
+
+
+def save_metadata(conn, grants_csv_path, total_rows, parsed_rows, dropped_rows=None):
+    now = datetime.now()
+    entries = [
+        ('source_file', grants_csv_path),
+        ('total_rows', str(total_rows)),
+        ('parsed_rows', str(parsed_rows)),
+        ('build_date', now.isoformat()),
+    ]
+    if dropped_rows is not None:
+        entries.append(('dropped_unparsed_rows', str(dropped_rows)))
+
+    values = ",\n            ".join("(?, ?, ?)" for _ in entries)
+    conn.execute(f"""
         INSERT INTO db_metadata (key, value, created_at)
         VALUES 
-            ('source_file', ?, NOW()),
-            ('total_rows', ?, NOW()),
-            ('parsed_rows', ?, NOW()),
-            ('build_date', ?, NOW())
-    """, [grants_csv_path, str(total_rows), str(parsed_rows), datetime.now().isoformat()])
+            {values}
+    """, [param for key, value in entries for param in (key, value, now)])
+
+
+def save_database_statistics(conn, stats):
+    conn.execute("""
+        INSERT OR REPLACE INTO db_metadata (key, value, created_at)
+        VALUES ('stats_json', ?, NOW())
+    """, [json.dumps(stats)])
+
+
+def get_cached_database_statistics(conn):
+    try:
+        row = conn.execute(
+            "SELECT value FROM db_metadata WHERE key = 'stats_json'").fetchone()
+    except duckdb.CatalogException:
+        return None
+    return json.loads(row[0]) if row else None
 
 
-def get_database_statistics(conn):
+def get_database_statistics(conn, exact=False, use_cache=True):
+    if use_cache and not exact:
+        cached = get_cached_database_statistics(conn)
+        if cached is not None:
+            return cached
+
     stats = {}
 
-    result = conn.execute("""
-        SELECT 
-            COUNT(*) as total_records,
-            COUNT(DISTINCT doi) as unique_dois,
-            COUNT(DISTINCT funder) as unique_funders,
-            COUNT(DISTINCT award_id) as unique_awards
-        FROM grants
-    """).fetchone()
+    if exact:
+        result = conn.execute("""
+            SELECT 
+                COUNT(*) as total_records,
+                COUNT(DISTINCT doi) as unique_dois,
+                COUNT(DISTINCT funder) as unique_funders,
+                COUNT(DISTINCT award_id) as unique_awards,
+                COUNT(*) FILTER (WHERE funder IS NOT NULL) as parsed_rows
+            FROM grants
+        """).fetchone()
+    else:
+        result = conn.execute("""
+            SELECT 
+                COUNT(*) as total_records,
+                APPROX_COUNT_DISTINCT(doi) as unique_dois,
+                APPROX_COUNT_DISTINCT(funder) as unique_funders,
+                APPROX_COUNT_DISTINCT(award_id) as unique_awards,
+                COUNT(*) FILTER (WHERE funder IS NOT NULL) as parsed_rows
+            FROM grants
+        """).fetchone()
 
     stats['total_records'] = result[0]
     stats['unique_dois'] = result[1]
     stats['unique_funders'] = result[2]
     stats['unique_awards'] = result[3]
-
-    parsed_rows = conn.execute(
-        "SELECT COUNT(*) FROM grants WHERE funder IS NOT NULL").fetchone()[0]
-    stats['parsed_rows'] = parsed_rows
+    stats['parsed_rows'] = result[4]
 
     return stats
 
 
-def get_funder_statistics(conn, funder_id):
-    result = conn.execute("""
+def table_exists(conn, table_name):
+    return conn.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = ?",
+        [table_name]).fetchone()[0] > 0
+
+
+def create_funder_summary(conn):
+    conn.execute("""
+        CREATE TABLE funder_summary AS
         SELECT 
+            funder,
+            COUNT(*) as count,
             COUNT(DISTINCT doi) as unique_dois,
-            COUNT(DISTINCT award_id) as unique_awards,
-            COUNT(*) as total_records
+            COUNT(DISTINCT award_id) as unique_awards
         FROM grants
-        WHERE funder = ?
-    """, [funder_id]).fetchone()
+        WHERE funder IS NOT NULL
+        GROUP BY funder
+        ORDER BY count DESC
+    """)
+
+
+def get_funder_statistics(conn, funder_id):
+    if table_exists(conn, 'funder_summary'):
+        result = conn.execute("""
+            SELECT unique_dois, unique_awards, count
+            FROM funder_summary
+            WHERE funder = ?
+        """, [funder_id]).fetchone() or (0, 0, 0)
+    else:
+        result = conn.execute("""
+            SELECT 
+                COUNT(DISTINCT doi) as unique_dois,
+                COUNT(DISTINCT award_id) as unique_awards,
+                COUNT(*) as total_records
+            FROM grants
+            WHERE funder = ?
+        """, [funder_id]).fetchone()
 
     return {
         'unique_dois': result[0],
@@ -95,6 +285,14 @@ def get_funder_statistics(conn, funder_id):
 
 
 def get_top_funders(conn, limit=10):
+    if table_exists(conn, 'funder_summary'):
+        return conn.execute("""
+            SELECT funder, count
+            FROM funder_summary
+            ORDER BY count DESC
+            LIMIT ?
+        """, [limit]).fetchall()
+
     return conn.execute("""
         SELECT funder, COUNT(*) as count
         FROM grants
@@ -105,13 +303,24 @@ def get_top_funders(conn, limit=10):
     """, [limit]).fetchall()
 
 
+STATISTICS_TEMPLATE = (
+    "\nDatabase Statistics:\n"
+    "  Total records: {total_records:,}\n"
+    "  Unique DOIs: {unique_dois:,}\n"
+    "  Unique funders: {unique_funders:,}\n"
+    "  Unique awards: {unique_awards:,}"
+)
+PARSED_ROWS_TEMPLATE = "\n  Rows with valid funder: {parsed_rows:,}"
+STATISTICS_DEFAULTS = {
+    'total_records': 0,
+    'unique_dois': 0,
+    'unique_funders': 0,
+    'unique_awards': 0,
+}
+
+
 def format_statistics_output(stats):
-    lines = []
-    lines.append("\nDatabase Statistics:")
-    lines.append(f"  Total records: {stats.get('total_records', 0):,}")
-    lines.append(f"  Unique DOIs: {stats.get('unique_dois', 0):,}")
-    lines.append(f"  Unique funders: {stats.get('unique_funders', 0):,}")
-    lines.append(f"  Unique awards: {stats.get('unique_awards', 0):,}")
+    template = STATISTICS_TEMPLATE
     if 'parsed_rows' in stats:
-        lines.append(f"  Rows with valid funder: {stats['parsed_rows']:,}")
-    return "\n".join(lines)
+        template += PARSED_ROWS_TEMPLATE
+    return template.format(**{**STATISTICS_DEFAULTS, **stats})
@@ -3,24 +3,59 @@ import sys
 import argparse
 import duckdb
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import xlsxwriter
+from collections import Counter
 from datetime import datetime
+from functools import lru_cache, wraps
 from pathlib import Path
-from collections import defaultdict
+from duckdb.typing import BOOLEAN, DOUBLE, VARCHAR
 from grants_db_common import (
     connect_to_database,
+    sql_literal,
+    sql_identifier,
     get_database_statistics,
     get_funder_statistics,
     get_top_funders,
     format_statistics_output
 )
 from utils.award_id_matcher import (
-    awards_match,
+    extract_segments,
+    is_fuzzy_match,
     get_match_type,
-    get_similarity_score,
-    extract_segments
+    get_similarity_score
 )
 
 
+UDF_CACHE_SIZE = 200_000
+EXCEL_BATCH_ROWS = 10_000
+EXCEL_MAX_ROWS = 1_048_576
+# pandas' default NA markers, so placeholder DOIs and awards load as missing
+INPUT_NULL_STRINGS = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+]
+
+
+def arrow_udf(func, return_type):
+    @wraps(func)
+    def batch_udf(*columns):
+        return pa.array([func(*values) for values in zip(*(column.to_pylist() for column in columns))],
+                        type=return_type)
+    return batch_udf
+
+
+def strip_award_ids(award_ids):
+    return pc.utf8_trim_whitespace(award_ids)
+
+
+def normalize_award_ids(award_ids):
+    normalized = pc.utf8_normalize(award_ids, form='NFKD')
+    normalized = pc.replace_substring_regex(normalized, pattern='[^A-Za-z0-9]', replacement='')
+    return pc.utf8_upper(normalized)
+
+
 def parse_arguments():
     parser = argparse.ArgumentParser(
         description='Grant reconciliation using DuckDB database',
@@ -30,6 +65,9 @@ Examples:
   # Query existing database with input file:
   %(prog)s query --db grants.db -i input.csv -f https://openalex.org/F4320306577
   
+  # Read a Parquet input and write the result files as Parquet:
+  %(prog)s query --db grants.db -i input.parquet -f https://openalex.org/F4320306577 --output-format parquet
+  
   # Show database information:
   %(prog)s info --db grants.db
   
@@ -44,13 +82,16 @@ Examples:
     query_parser.add_argument('--db', required=True,
                               help='Path to existing database file')
     query_parser.add_argument(
-        '-i', '--input-file', required=True, help='Path to input funding CSV file')
+        '-i', '--input-file', required=True,
+        help='Path to input funding CSV file (or a .parquet file)')
     query_parser.add_argument('-f', '--funder-id', required=True,
                               help='OpenAlex Funder ID to match (e.g., https://openalex.org/F4320306577)')
     query_parser.add_argument('-a', '--award-field', default='award_id',
                               help='Column name for award ID in input file (default: award_id)')
     query_parser.add_argument('-o', '--output-dir', default='output',
                               help='Directory for output files (default: output)')
+    query_parser.add_argument('--output-format', choices=['csv', 'parquet'], default='csv',
+                              help='File format for the result files (default: csv)')
     query_parser.add_argument(
         '-v', '--verbose', action='store_true', help='Verbose output')
     query_parser.add_argument('-e', '--excel', action='store_true',
@@ -60,11 +101,15 @@ Examples:
         'info', help='Show database information')
     info_parser.add_argument('--db', required=True,
                              help='Path to database file')
+    info_parser.add_argument('--exact-stats', action='store_true',
+                             help='Compute exact distinct counts instead of approximate ones')
+    info_parser.add_argument('--refresh-stats', action='store_true',
+                             help='Recompute statistics instead of using those cached at build time')
 
     return parser.parse_args()
 
 
-def create_excel_report(results, input_file, output_dir, stats=None):
+def create_excel_report(conn, result_counts, input_file, output_dir, stats=None):
     input_basename = Path(input_file).stem
     excel_file = Path(output_dir) / f"{input_basename}_grants_overlap_analysis.xlsx"
 
@@ -75,7 +120,17 @@ def create_excel_report(results, input_file, output_dir, stats=None):
         'openalex_grants_not_in_funder': 'openalex_grants_not_in_funder'
     }
 
-    with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
+    # constant_memory flushes each row once the next one starts, so sheets
+    # must be written strictly row by row. Strings stay plain text: past
+    # Excel's 65,530 hyperlinks per sheet xlsxwriter silently drops rows
+    workbook = xlsxwriter.Workbook(excel_file, {
+        'constant_memory': True,
+        'strings_to_urls': False,
+        'strings_to_formulas': False,
+    })
+    header_format = workbook.add_format(
+        {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    try:
         if stats:
             stats_data = []
 
@@ -136,67 +191,121 @@ def create_excel_report(results, input_file, output_dir, stats=None):
                     label = key.replace('pct_', '').replace('_', ' ').title()
                     stats_data.append([label, f'{value:.2f}%'])
 
-            stats_df = pd.DataFrame(stats_data, columns=['Metric', 'Value'])
-            stats_df.to_excel(
-                writer, sheet_name='Statistics Summary', index=False)
+            worksheet = workbook.add_worksheet('Statistics Summary')
+            worksheet.write_row(0, 0, ['Metric', 'Value'], header_format)
+            for row_number, row in enumerate(stats_data, start=1):
+                worksheet.write_row(row_number, 0, row)
 
-        for category, df in results.items():
+        for category, count in result_counts.items():
             sheet_name = sheet_names.get(category, category)[:31]
-            if not df.empty:
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
+            if count > 0:
+                if count >= EXCEL_MAX_ROWS:
+                    print(f"Warning: {category} has {count:,} records; "
+                          f"only the first {EXCEL_MAX_ROWS - 1:,} fit in the Excel sheet")
+                write_result_sheet(conn, workbook.add_worksheet(sheet_name),
+                                   RESULT_TABLES[category], header_format)
+    finally:
+        workbook.close()
 
     return excel_file
 
 
-def unified_award_id_matching(oa_grants_df, input_with_doi_df, input_without_doi_df):
+RESULT_COPY_OPTIONS = {
+    'csv': "FORMAT CSV, HEADER",
+    'parquet': "FORMAT PARQUET, COMPRESSION SNAPPY",
+}
+
+
+RESULT_TABLES = {
+    'funder_work_and_grant_id_match_in_openalex': 'res_both',
+    'funder_work_matched_in_openalex_grant_id_differs': 'res_differs',
+    'funder_grants_not_in_openalex': 'res_neither',
+    'openalex_grants_not_in_funder': 'res_not_in_funder'
+}
+
+
+def write_result_file(conn, table_name, filepath, output_format='csv'):
+    conn.execute(f"COPY {table_name} TO {sql_literal(filepath)} "
+                 f"({RESULT_COPY_OPTIONS[output_format]})")
+
+
+def write_result_sheet(conn, worksheet, table_name, header_format=None):
+    cursor = conn.execute(f"SELECT * FROM {table_name} LIMIT {EXCEL_MAX_ROWS - 1}")
+    worksheet.write_row(0, 0, [column[0] for column in cursor.description], header_format)
+    row_number = 1
+    while rows := cursor.fetchmany(EXCEL_BATCH_ROWS):
+        for row in rows:
+            worksheet.write_row(row_number, 0, row)
+            row_number += 1
+
+
+def count_result_rows(conn):
+    counts = conn.execute("SELECT " + ", ".join(
+        f"(SELECT COUNT(*) FROM {table_name})" for table_name in RESULT_TABLES.values())).fetchone()
+    return dict(zip(RESULT_TABLES, counts))
+
+
+def unified_award_id_matching(conn, oa_grants_df):
     print("Building unified inverted index for award ID matching...")
     
-    oa_with_awards = oa_grants_df[oa_grants_df['award_id'].notna()].copy()
-    oa_without_awards = oa_grants_df[oa_grants_df['award_id'].isna()].copy()
-    
-    oa_awards = oa_with_awards['award_id'].unique() if not oa_with_awards.empty else []
-    print(f"Processing {len(oa_awards):,} unique OpenAlex awards")
-    print(f"Also including {len(oa_without_awards):,} OpenAlex grants with no award_id (funder-only)")
-    
-    all_input_awards = []
-    
-    awards_with_doi = input_with_doi_df['award_id'].dropna().unique()
-    all_input_awards.extend(awards_with_doi)
+    oa_award_count = oa_grants_df['award_id'].nunique()
+    oa_without_awards = oa_grants_df['award_id'].isna().sum()
+    print(f"Processing {oa_award_count:,} unique OpenAlex awards")
+    print(f"Also including {oa_without_awards:,} OpenAlex grants with no award_id (funder-only)")
     
-    if not input_without_doi_df.empty:
-        awards_without_doi = input_without_doi_df['award_id'].dropna().unique()
-        all_input_awards.extend(awards_without_doi)
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE input_awards AS
+        SELECT 
+            CAST(award_id AS VARCHAR) as award_id,
+            BOOL_OR(doi IS NULL) as without_doi
+        FROM input_data
+        WHERE award_id IS NOT NULL
+        GROUP BY CAST(award_id AS VARCHAR)
+    """)
+    awards_without_doi = {row[0] for row in conn.execute(
+        "SELECT award_id FROM input_awards WHERE without_doi").fetchall()}
+    if awards_without_doi:
         print(f"Including {len(awards_without_doi):,} awards from entries without DOIs")
     
-    all_input_awards = list(set(all_input_awards))
-    print(f"Total unique input awards to check: {len(all_input_awards):,}")
+    input_award_count = conn.execute("SELECT COUNT(*) FROM input_awards").fetchone()[0]
+    print(f"Total unique input awards to check: {input_award_count:,}")
     
-    input_index = defaultdict(set)
-    for award in all_input_awards:
-        segments = extract_segments(award)
-        for seg in segments:
-            if len(seg) > 2 or not seg.isdigit():
-                input_index[seg].add(award)
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE input_award_segs AS
+        SELECT award_id, segment.seg as seg
+        FROM (
+            SELECT award_id, UNNEST(award_segments(award_id)) as segment
+            FROM input_awards
+        )
+        WHERE length(segment.seg) > 2 OR NOT segment.is_numeric
+    """)
     
-    print(f"Matching {len(oa_awards):,} OpenAlex awards against {len(all_input_awards):,} input awards...")
-    oa_to_input_matches = {}
-    matched_count = 0
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE oa_award_segs AS
+        SELECT award_id, UNNEST(award_segments(award_id)).seg as seg
+        FROM (
+            SELECT DISTINCT award_id
+            FROM gf
+            WHERE award_id IS NOT NULL
+        )
+    """)
     
-    for i, oa_award in enumerate(oa_awards):
-        if (i + 1) % 1000 == 0:
-            print(f"  Processed {i+1:,}/{len(oa_awards):,}...")
-        
-        candidates = set()
-        segments = extract_segments(oa_award)
-        for seg in segments:
-            if seg in input_index:
-                candidates.update(input_index[seg])
-        
-        for input_award in candidates:
-            if awards_match(oa_award, input_award, match_types=['substring', 'normalized']):
-                oa_to_input_matches[oa_award] = input_award
-                matched_count += 1
-                break
+    print(f"Matching {oa_award_count:,} OpenAlex awards against {input_award_count:,} input awards...")
+    oa_to_input_matches = dict(conn.execute("""
+        WITH candidates AS (
+            SELECT DISTINCT o.award_id as oa_award_id, i.award_id as input_award_id
+            FROM oa_award_segs o
+            JOIN input_award_segs i USING (seg)
+        )
+        SELECT c.oa_award_id,
+               FIRST(c.input_award_id ORDER BY c.input_award_id <> c.oa_award_id, c.input_award_id)
+        FROM candidates c
+        JOIN award_keys ok ON ok.award_id = c.oa_award_id
+        JOIN award_keys ik ON ik.award_id = c.input_award_id
+        WHERE award_overlap(ok.award_trim, ok.award_norm, ik.award_trim, ik.award_norm)
+        GROUP BY c.oa_award_id
+    """).fetchall())
+    matched_count = len(oa_to_input_matches)
     
     print(f"Found {matched_count:,} OpenAlex awards with matches in input")
     
@@ -210,32 +319,45 @@ def unified_award_id_matching(oa_grants_df, input_with_doi_df, input_without_doi
     oa_not_matched_by_doi.loc[no_award_mask, 'has_no_award_id'] = True
     
     matched_rows = (oa_not_matched_by_doi['has_award_overlap'] == True)
+    overlap_match_types = Counter()
     if matched_rows.any():
-        oa_not_matched_by_doi.loc[matched_rows, 'match_type'] = oa_not_matched_by_doi.loc[matched_rows].apply(
-            lambda row: get_match_type(row['award_id'], row['matching_input_award_id']), axis=1
-        )
-        oa_not_matched_by_doi.loc[matched_rows, 'similarity_score'] = oa_not_matched_by_doi.loc[matched_rows].apply(
-            lambda row: round(get_similarity_score(row['award_id'], row['matching_input_award_id']), 3), axis=1
-        )
+        pairs = [tuple(pair) for pair in oa_not_matched_by_doi.loc[
+            matched_rows, ['award_id', 'matching_input_award_id']].to_numpy()]
+        pair_annotations = {
+            pair: (get_match_type(*pair), round(get_similarity_score(*pair), 3))
+            for pair in set(pairs)
+        }
+        oa_not_matched_by_doi['match_type'] = None
+        oa_not_matched_by_doi['similarity_score'] = None
+        oa_not_matched_by_doi.loc[matched_rows, 'match_type'] = [
+            pair_annotations[pair][0] for pair in pairs]
+        oa_not_matched_by_doi.loc[matched_rows, 'similarity_score'] = [
+            pair_annotations[pair][1] for pair in pairs]
+        overlap_match_types.update(pair_annotations[pair][0] for pair in pairs)
     
     overlap_from_no_doi = 0
-    if not input_without_doi_df.empty:
-        awards_without_doi_set = set(input_without_doi_df['award_id'].dropna().unique())
+    if awards_without_doi:
         overlap_from_no_doi = oa_not_matched_by_doi[
-            oa_not_matched_by_doi['matching_input_award_id'].isin(awards_without_doi_set)
+            oa_not_matched_by_doi['matching_input_award_id'].isin(awards_without_doi)
         ]['has_award_overlap'].sum()
     
-    print(f"Total OpenAlex grants with award overlap: {oa_not_matched_by_doi['has_award_overlap'].sum():,}")
+    overlap_count = int(matched_rows.sum())
+    print(f"Total OpenAlex grants with award overlap: {overlap_count:,}")
     if overlap_from_no_doi > 0:
         print(f"  (including {overlap_from_no_doi:,} matched via entries without DOIs)")
     if no_award_mask.sum() > 0:
         print(f"OpenAlex grants with no award_id (funder-only): {no_award_mask.sum():,}")
     
-    return oa_not_matched_by_doi
+    overlap_counts = {
+        'total_not_matched_by_doi': len(oa_not_matched_by_doi),
+        'with_award_overlap': overlap_count,
+        'overlap_match_types': overlap_match_types
+    }
+    return oa_not_matched_by_doi, overlap_counts
 
 
 def query_database(db_path, input_file, funder_id, award_field='award_id',
-                   output_dir='output', verbose=False, excel=False):
+                   output_dir='output', verbose=False, excel=False, output_format='csv'):
 
     if not os.path.exists(db_path):
         print(f"Error: Database file not found: {db_path}")
@@ -245,45 +367,69 @@ def query_database(db_path, input_file, funder_id, award_field='award_id',
     conn = connect_to_database(db_path, read_only=False)
 
     try:
-        print(f"Loading input file: {input_file}")
-        input_df = pd.read_csv(input_file)
-
-        if award_field in input_df.columns and award_field != 'award_id':
-            input_df.rename(columns={award_field: 'award_id'}, inplace=True)
-
-        if 'doi' in input_df.columns:
-            input_df['doi'] = input_df['doi'].astype(str)
-            input_df['doi'] = input_df['doi'].replace('nan', pd.NA)
-            input_df.loc[input_df['doi'].notna(), 'doi'] = input_df.loc[input_df['doi'].notna(), 'doi'].str.lower().str.strip()
-            input_df['doi'] = input_df['doi'].replace('', pd.NA)
-
-        print(f"Loaded {len(input_df):,} records from input file")
-        
-        entries_with_doi = input_df[input_df['doi'].notna()].copy()
-        entries_without_doi = input_df[input_df['doi'].isna()].copy()
-        
-        print(f"  - Records with DOI: {len(entries_with_doi):,}")
-        print(f"  - Records without DOI: {len(entries_without_doi):,}")
-
-        conn.execute("DROP TABLE IF EXISTS input_data")
-        conn.execute("CREATE TEMP TABLE input_data AS SELECT * FROM input_df")
-        
-        conn.execute("DROP TABLE IF EXISTS input_with_doi")
-        conn.execute("CREATE TEMP TABLE input_with_doi AS SELECT * FROM entries_with_doi")
-        
-        conn.execute("DROP TABLE IF EXISTS input_without_doi")
-        conn.execute("CREATE TEMP TABLE input_without_doi AS SELECT * FROM entries_without_doi")
-        
-        def awards_match_udf(id1, id2):
-            return awards_match(id1, id2)
-
-        def get_match_type_udf(id1, id2):
-            return get_match_type(id1, id2)
+        if verbose:
+            conn.execute("SET enable_progress_bar = true")
 
-        conn.create_function('awards_match', awards_match_udf, return_type=bool)
-        conn.create_function('get_match_type', get_match_type_udf, return_type=str)
-        
-        conn.create_function('get_similarity_score', get_similarity_score, return_type=float)
+        print(f"Loading input file: {input_file}")
+        award_column = sql_identifier(award_field)
+        rename_clause = f"RENAME ({award_column} AS award_id)" if award_field != 'award_id' else ""
+        if Path(input_file).suffix.lower() == '.parquet':
+            input_source = f"""(
+                SELECT * REPLACE (CAST(doi AS VARCHAR) as doi,
+                                  CAST({award_column} AS VARCHAR) as {award_column})
+                FROM read_parquet(?))"""
+        else:
+            input_source = f"""read_csv_auto(?, header=true, all_varchar=true,
+                nullstr=[{', '.join(sql_literal(value) for value in INPUT_NULL_STRINGS)}])"""
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE input_data AS
+            SELECT * REPLACE (NULLIF(LOWER(TRIM(doi)), '') as doi) {rename_clause}
+            FROM {input_source}
+        """, [input_file])
+        conn.execute("CREATE OR REPLACE TEMP VIEW input_with_doi AS SELECT * FROM input_data WHERE doi IS NOT NULL")
+        conn.execute("CREATE OR REPLACE TEMP VIEW input_without_doi AS SELECT * FROM input_data WHERE doi IS NULL")
+
+        total_input, input_with_doi_count = conn.execute(
+            "SELECT COUNT(*), COUNT(doi) FROM input_data").fetchone()
+        print(f"Loaded {total_input:,} records from input file")
+        print(f"  - Records with DOI: {input_with_doi_count:,}")
+        print(f"  - Records without DOI: {total_input - input_with_doi_count:,}")
+
+        @lru_cache(maxsize=UDF_CACHE_SIZE)
+        def is_fuzzy_match_udf(id1, id2):
+            return is_fuzzy_match(id1, id2)
+
+        # get_similarity_score carries its own lru_cache
+        def get_similarity_score_udf(id1, id2):
+            return get_similarity_score(id1, id2)
+
+        conn.create_function('is_fuzzy_match', arrow_udf(is_fuzzy_match_udf, pa.bool_()),
+                             [VARCHAR, VARCHAR], BOOLEAN, type='arrow')
+        conn.create_function('get_similarity_score', arrow_udf(get_similarity_score_udf, pa.float64()),
+                             [VARCHAR, VARCHAR], DOUBLE, type='arrow')
+        conn.create_function('strip_award_id', strip_award_ids,
+                             [VARCHAR], VARCHAR, type='arrow')
+        conn.create_function('normalize_award_id', normalize_award_ids,
+                             [VARCHAR], VARCHAR, type='arrow')
+
+        conn.execute("""
+            CREATE OR REPLACE TEMP MACRO award_overlap(trim1, norm1, trim2, norm2) AS
+                trim1 = trim2 OR (
+                    trim1 <> '' AND trim2 <> '' AND (
+                        contains(trim1, trim2) OR contains(trim2, trim1)
+                        OR contains(norm1, norm2) OR contains(norm2, norm1)
+                    )
+                )
+        """)
+
+        def award_segments_udf(award_id):
+            return [(seg, number is not None) for seg, number in extract_segments(award_id)]
+
+        conn.create_function('award_segments', arrow_udf(award_segments_udf, pa.list_(pa.struct(
+                                 [('seg', pa.string()), ('is_numeric', pa.bool_())]))),
+                             [VARCHAR], duckdb.list_type(duckdb.struct_type(
+                                 {'seg': VARCHAR, 'is_numeric': BOOLEAN})),
+                             type='arrow')
 
         funder_stats = get_funder_statistics(conn, funder_id)
 
@@ -294,49 +440,112 @@ def query_database(db_path, input_file, funder_id, award_field='award_id',
             print(f"  Unique DOIs: {funder_stats['unique_dois']:,}")
             print(f"  Unique awards: {funder_stats['unique_awards']:,}")
 
+        conn.execute("""
+            CREATE OR REPLACE TEMP TABLE gf AS
+            SELECT doi, award_id, work_id
+            FROM grants
+            WHERE funder = ?
+        """, [funder_id])
+
+        conn.execute("""
+            CREATE OR REPLACE TEMP TABLE award_keys AS
+            SELECT 
+                award_id,
+                strip_award_id(award_id) as award_trim,
+                normalize_award_id(award_id) as award_norm
+            FROM (
+                SELECT CAST(award_id AS VARCHAR) as award_id FROM input_data
+                UNION
+                SELECT award_id FROM gf
+            )
+            WHERE award_id IS NOT NULL
+        """)
+
         print("\nPerforming reconciliation...")
 
-        with_both = conn.execute("""
-            SELECT DISTINCT 
+        conn.execute("""
+            CREATE OR REPLACE TEMP TABLE award_pairs AS
+            SELECT 
+                p.input_award_id,
+                p.openalex_award_id,
+                CASE
+                    WHEN ik.award_trim = gk.award_trim THEN 'exact'
+                    WHEN award_overlap(ik.award_trim, ik.award_norm, gk.award_trim, gk.award_norm)
+                        THEN 'substring'
+                    WHEN ik.award_trim <> '' AND gk.award_trim <> ''
+                        AND is_fuzzy_match(ik.award_trim, gk.award_trim) THEN 'fuzzy'
+                END as match_type,
+                ROUND(CASE
+                    WHEN ik.award_trim = gk.award_trim THEN 1.0
+                    WHEN ik.award_norm = gk.award_norm THEN 0.95
+                    ELSE get_similarity_score(ik.award_trim, gk.award_trim)
+                END, 3) as similarity_score
+            FROM (
+                SELECT DISTINCT
+                    CAST(i.award_id AS VARCHAR) as input_award_id,
+                    g.award_id as openalex_award_id
+                FROM input_with_doi i
+                JOIN gf g ON i.doi = g.doi
+                WHERE i.award_id IS NOT NULL AND g.award_id IS NOT NULL
+            ) p
+            JOIN award_keys ik ON ik.award_id = p.input_award_id
+            JOIN award_keys gk ON gk.award_id = p.openalex_award_id
+        """)
+
+        conn.execute("""
+            CREATE OR REPLACE TEMP TABLE reconciled AS
+            SELECT 
                 i.*,
                 i.award_id as funder_award_id,
                 g.award_id as openalex_award_id,
                 g.work_id,
-                get_match_type(CAST(i.award_id AS VARCHAR), CAST(g.award_id AS VARCHAR)) as match_type,
-                ROUND(get_similarity_score(CAST(i.award_id AS VARCHAR), CAST(g.award_id AS VARCHAR)), 3) as similarity_score
+                ap.match_type,
+                ap.similarity_score,
+                g.doi IS NOT NULL as in_openalex
             FROM input_with_doi i
-            INNER JOIN grants g ON i.doi = g.doi 
-                AND awards_match(CAST(i.award_id AS VARCHAR), CAST(g.award_id AS VARCHAR))
-                AND g.funder = ?
-        """, [funder_id]).df()
-
-        with_funder_only = conn.execute("""
-            SELECT DISTINCT 
-                i.*,
-                i.award_id as funder_award_id,
-                g.award_id as openalex_award_id,
-                g.work_id,
+            LEFT JOIN gf g ON i.doi = g.doi
+            LEFT JOIN award_pairs ap
+                ON ap.input_award_id = CAST(i.award_id AS VARCHAR)
+                AND ap.openalex_award_id = g.award_id
+        """)
+
+        conn.execute("""
+            CREATE OR REPLACE TEMP TABLE res_both AS
+            SELECT DISTINCT * EXCLUDE (in_openalex, award_id)
+            FROM reconciled
+            WHERE match_type IS NOT NULL
+        """)
+
+        conn.execute("""
+            CREATE OR REPLACE TEMP TABLE res_differs AS
+            SELECT DISTINCT * EXCLUDE (in_openalex) REPLACE (
                 CASE 
-                    WHEN i.award_id IS NULL OR g.award_id IS NULL THEN 'missing'
+                    WHEN funder_award_id IS NULL OR openalex_award_id IS NULL THEN 'missing'
                     ELSE 'no_match'
-                END as match_type,
-                ROUND(get_similarity_score(CAST(i.award_id AS VARCHAR), CAST(g.award_id AS VARCHAR)), 3) as similarity_score
-            FROM input_with_doi i
-            INNER JOIN grants g ON i.doi = g.doi AND g.funder = ?
-            WHERE NOT awards_match(CAST(i.award_id AS VARCHAR), CAST(g.award_id AS VARCHAR))
-        """, [funder_id]).df()
-
-        with_neither = conn.execute("""
-            SELECT DISTINCT i.*,
-                   (SELECT work_id FROM grants g 
-                    WHERE g.doi = i.doi 
-                    LIMIT 1) as work_id
-            FROM input_with_doi i
-            WHERE NOT EXISTS (
-                SELECT 1 FROM grants g 
-                WHERE i.doi = g.doi AND g.funder = ?
+                END as match_type
+            )
+            FROM reconciled
+            WHERE in_openalex AND match_type IS NULL
+        """)
+
+        conn.execute("""
+            CREATE OR REPLACE TEMP TABLE res_neither AS
+            WITH neither AS (
+                SELECT * EXCLUDE (funder_award_id, openalex_award_id, work_id, match_type,
+                                  similarity_score, in_openalex)
+                FROM reconciled
+                WHERE NOT in_openalex
+            ),
+            other_funder_works AS (
+                SELECT doi, ANY_VALUE(work_id) as work_id
+                FROM grants
+                WHERE doi IN (SELECT doi FROM neither)
+                GROUP BY doi
             )
-        """, [funder_id]).df()
+            SELECT DISTINCT n.*, w.work_id
+            FROM neither n
+            LEFT JOIN other_funder_works w ON n.doi = w.doi
+        """)
         
         print("\nPerforming unified award ID matching...")
         
@@ -344,52 +553,40 @@ def query_database(db_path, input_file, funder_id, award_field='award_id',
             SELECT DISTINCT
                 g.work_id,
                 g.doi,
-                g.award_id
-            FROM grants g
-            WHERE g.funder = ?
-        """, [funder_id]).df()
+                g.award_id,
+                NOT EXISTS (
+                    SELECT 1 FROM input_with_doi i WHERE i.doi = g.doi
+                ) as not_matched_by_doi
+            FROM gf g
+        """).arrow().to_pandas(types_mapper=pd.ArrowDtype)
         
-        dois_not_matched_raw = conn.execute("""
-            SELECT DISTINCT g.doi
-            FROM grants g
-            LEFT JOIN input_with_doi i ON g.doi = i.doi
-            WHERE g.funder = ?
-              AND i.doi IS NULL
-        """, [funder_id]).df()
-        
-        all_oa_grants['not_matched_by_doi'] = all_oa_grants['doi'].isin(dois_not_matched_raw['doi'])
-        
-        dois_not_in_input = unified_award_id_matching(
-            all_oa_grants, 
-            entries_with_doi, 
-            entries_without_doi
+        dois_not_in_input, award_overlap_counts = unified_award_id_matching(
+            conn,
+            all_oa_grants
         )
         
-        dois_not_in_input = dois_not_in_input[dois_not_in_input['not_matched_by_doi'] == True].drop('not_matched_by_doi', axis=1)
+        dois_not_in_input = pa.Table.from_pandas(
+            dois_not_in_input[dois_not_in_input['not_matched_by_doi'] == True].drop('not_matched_by_doi', axis=1),
+            preserve_index=False)
+        conn.execute("CREATE OR REPLACE TEMP TABLE res_not_in_funder AS SELECT * FROM dois_not_in_input")
 
         Path(output_dir).mkdir(parents=True, exist_ok=True)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         input_basename = Path(input_file).stem
-        
-        if 'award_id' in with_both.columns and 'funder_award_id' in with_both.columns:
-            with_both = with_both.drop('award_id', axis=1)
-
-        results = {
-            'funder_work_and_grant_id_match_in_openalex': with_both,
-            'funder_work_matched_in_openalex_grant_id_differs': with_funder_only,
-            'funder_grants_not_in_openalex': with_neither,
-            'openalex_grants_not_in_funder': dois_not_in_input
+
+        result_counts = count_result_rows(conn)
+        output_files = {
+            category: Path(output_dir) / f"{input_basename}_{category}_{timestamp}.{output_format}"
+            for category, count in result_counts.items() if count > 0
         }
+        for category, filepath in output_files.items():
+            write_result_file(conn, RESULT_TABLES[category], filepath, output_format)
 
         print("\nReconciliation Results:")
-        for category, df in results.items():
-            if not df.empty:
-                filename = f"{input_basename}_{category}_{timestamp}.csv"
-                filepath = Path(output_dir) / filename
-                df.to_csv(filepath, index=False)
-                print(f"  {category}: {len(df):,} records -> {filepath}")
-
-        stats = generate_statistics(conn, input_df, results, funder_id)
+        for category, filepath in output_files.items():
+            print(f"  {category}: {result_counts[category]:,} records -> {filepath}")
+
+        stats = generate_statistics(conn, result_counts, funder_id, award_overlap_counts)
         print_statistics(stats)
 
         stats_file = Path(output_dir) / f"reconciliation_stats_{input_basename}_{timestamp}.txt"
@@ -397,7 +594,7 @@ def query_database(db_path, input_file, funder_id, award_field='award_id',
 
         if excel:
             excel_file = create_excel_report(
-                results, input_file, output_dir, stats)
+                conn, result_counts, input_file, output_dir, stats)
             print(f"\nExcel report created: {excel_file}")
 
         print(f"\nReconciliation complete! Results saved to {output_dir}")
@@ -413,7 +610,7 @@ def query_database(db_path, input_file, funder_id, award_field='award_id',
         conn.close()
 
 
-def show_database_info(db_path):
+def show_database_info(db_path, exact_stats=False, refresh_stats=False):
     if not os.path.exists(db_path):
         print(f"Error: Database file not found: {db_path}")
         return False
@@ -426,14 +623,14 @@ def show_database_info(db_path):
 
     try:
         metadata = conn.execute(
-            "SELECT key, value FROM db_metadata").fetchall()
+            "SELECT key, value FROM db_metadata WHERE key <> 'stats_json'").fetchall()
         if metadata:
             print("Database Metadata:")
             for key, value in metadata:
                 print(f"  {key}: {value}")
             print()
 
-        stats = get_database_statistics(conn)
+        stats = get_database_statistics(conn, exact=exact_stats, use_cache=not refresh_stats)
         print(format_statistics_output(stats))
         print()
 
@@ -452,88 +649,87 @@ def show_database_info(db_path):
         conn.close()
 
 
-def generate_statistics(conn, input_df, results, funder_id):
+def generate_statistics(conn, result_counts, funder_id, award_overlap_counts=None):
     funder_stats = get_funder_statistics(conn, funder_id)
 
-    entries_with_doi_count = input_df['doi'].notna().sum() if 'doi' in input_df.columns else 0
-    entries_without_doi_count = input_df['doi'].isna().sum() if 'doi' in input_df.columns else 0
+    total_input, entries_with_doi_count, unique_dois, unique_award_ids = conn.execute("""
+        SELECT 
+            COUNT(*),
+            COUNT(doi),
+            COUNT(DISTINCT doi),
+            COUNT(DISTINCT award_id)
+        FROM input_data
+    """).fetchone()
+    entries_without_doi_count = total_input - entries_with_doi_count
 
     match_type_breakdown = {}
-    if 'funder_work_and_grant_id_match_in_openalex' in results:
-        df_matched = results['funder_work_and_grant_id_match_in_openalex']
-        if not df_matched.empty and 'match_type' in df_matched.columns:
-            match_type_counts = df_matched['match_type'].value_counts().to_dict()
-            match_type_breakdown = {
-                'exact_matches': match_type_counts.get('exact', 0),
-                'substring_matches': match_type_counts.get('substring', 0),
-                'normalized_matches': match_type_counts.get('normalized', 0),
-                'fuzzy_matches': match_type_counts.get('fuzzy', 0)
-            }
+    if result_counts.get('funder_work_and_grant_id_match_in_openalex', 0) > 0:
+        match_type_counts = dict(conn.execute(f"""
+            SELECT match_type, COUNT(*)
+            FROM {RESULT_TABLES['funder_work_and_grant_id_match_in_openalex']}
+            GROUP BY match_type
+        """).fetchall())
+        match_type_breakdown = {
+            'exact_matches': match_type_counts.get('exact', 0),
+            'substring_matches': match_type_counts.get('substring', 0),
+            'normalized_matches': match_type_counts.get('normalized', 0),
+            'fuzzy_matches': match_type_counts.get('fuzzy', 0)
+        }
     
     award_overlap_stats = {}
-    if 'openalex_grants_not_in_funder' in results:
-        df_not_in_funder = results['openalex_grants_not_in_funder']
-        if not df_not_in_funder.empty and 'has_award_overlap' in df_not_in_funder.columns:
-            total_not_by_doi = len(df_not_in_funder)
-            with_overlap = df_not_in_funder[df_not_in_funder['has_award_overlap'] == True]
-            overlap_count = len(with_overlap)
-            
-            award_overlap_stats = {
-                'total_not_matched_by_doi': total_not_by_doi,
-                'with_award_overlap': overlap_count,
-                'truly_missing': total_not_by_doi - overlap_count
+    if award_overlap_counts and award_overlap_counts['total_not_matched_by_doi'] > 0:
+        total_not_by_doi = award_overlap_counts['total_not_matched_by_doi']
+        overlap_count = award_overlap_counts['with_award_overlap']
+        
+        award_overlap_stats = {
+            'total_not_matched_by_doi': total_not_by_doi,
+            'with_award_overlap': overlap_count,
+            'truly_missing': total_not_by_doi - overlap_count
+        }
+        
+        if overlap_count > 0:
+            overlap_match_types = award_overlap_counts['overlap_match_types']
+            award_overlap_stats['overlap_match_types'] = {
+                'exact': overlap_match_types.get('exact', 0),
+                'substring': overlap_match_types.get('substring', 0),
+                'normalized': overlap_match_types.get('normalized', 0),
+                'fuzzy': overlap_match_types.get('fuzzy', 0)
             }
-            
-            if overlap_count > 0 and 'match_type' in with_overlap.columns:
-                overlap_match_types = with_overlap['match_type'].value_counts().to_dict()
-                award_overlap_stats['overlap_match_types'] = {
-                    'exact': overlap_match_types.get('exact', 0),
-                    'substring': overlap_match_types.get('substring', 0),
-                    'normalized': overlap_match_types.get('normalized', 0),
-                    'fuzzy': overlap_match_types.get('fuzzy', 0)
-                }
     
     stats = {
         'timestamp': datetime.now().isoformat(),
         'funder_id': funder_id,
         'input_file_stats': {
-            'total_records': len(input_df),
+            'total_records': total_input,
             'records_with_doi': entries_with_doi_count,
             'records_without_doi': entries_without_doi_count,
-            'unique_dois': input_df['doi'].nunique() if 'doi' in input_df.columns else 0,
-            'unique_award_ids': input_df['award_id'].nunique() if 'award_id' in input_df.columns else 0
+            'unique_dois': unique_dois,
+            'unique_award_ids': unique_award_ids
         },
         'grants_db_stats': {
             'funder_unique_dois': funder_stats['unique_dois'],
             'funder_unique_awards': funder_stats['unique_awards'],
             'funder_total_mappings': funder_stats['total_records']
         },
-        'reconciliation_results': {
-            'funder_work_and_grant_id_match_in_openalex': len(results.get('funder_work_and_grant_id_match_in_openalex', [])),
-            'funder_work_matched_in_openalex_grant_id_differs': len(results.get('funder_work_matched_in_openalex_grant_id_differs', [])),
-            'funder_grants_not_in_openalex': len(results.get('funder_grants_not_in_openalex', [])),
-            'openalex_grants_not_in_funder': len(results.get('openalex_grants_not_in_funder', []))
-        },
+        'reconciliation_results': dict(result_counts),
         'match_type_breakdown': match_type_breakdown,
         'award_overlap_analysis': award_overlap_stats,
         'percentages': {}
     }
 
-    total_input = len(input_df)
     if total_input > 0:
         if entries_with_doi_count > 0:
             stats['percentages']['pct_work_and_award_matched'] = (
                 100.0 *
-                len(results.get('funder_work_and_grant_id_match_in_openalex', [])) / entries_with_doi_count
+                result_counts['funder_work_and_grant_id_match_in_openalex'] / entries_with_doi_count
             )
             stats['percentages']['pct_work_matched_award_differs'] = (
                 100.0 *
-                len(results.get(
-                    'funder_work_matched_in_openalex_grant_id_differs', [])) / entries_with_doi_count
+                result_counts['funder_work_matched_in_openalex_grant_id_differs'] / entries_with_doi_count
             )
             stats['percentages']['pct_records_not_in_openalex'] = (
                 100.0 *
-                len(results.get('funder_grants_not_in_openalex', [])) / entries_with_doi_count
+                result_counts['funder_grants_not_in_openalex'] / entries_with_doi_count
             )
 
     return stats
@@ -658,12 +854,13 @@ def main():
             args.award_field,
             args.output_dir,
             args.verbose,
-            args.excel
+            args.excel,
+            args.output_format
         )
         return 0 if success else 1
 
     elif args.command == 'info':
-        success = show_database_info(args.db)
+        success = show_database_info(args.db, args.exact_stats, args.refresh_stats)
         return 0 if success else 1
 
     return 0
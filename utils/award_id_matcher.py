@@ -1,45 +1,62 @@
 import re
 import unicodedata
-from typing import Optional, Tuple, List
 from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Optional, Tuple, List
+from rapidfuzz.distance import Indel, Levenshtein
+
 
+NON_ALNUM_RE = re.compile(r'[^A-Za-z0-9]')
+SEGMENT_SEPARATOR_RE = re.compile(r'[-_./\s]+')
+DIGITS_RE = re.compile(r'\d+')
+DIGIT_RE = re.compile(r'\d')
+DASH_TRANSLATION = str.maketrans(dict.fromkeys('‐–—−', '-'))
+# Keeps ASCII letters and digits (uppercased) and drops every other ASCII character
+ASCII_NORMALIZATION = {
+    code: (chr(code).upper() if chr(code).isalnum() else None) for code in range(128)
+}
 
+
+@lru_cache(maxsize=200_000)
 def normalize_award_id(award_id):
     if not award_id:
         return ""
 
-    award_id_ascii = unicodedata.normalize('NFKD', str(award_id))
+    award_id_str = str(award_id)
+    if award_id_str.isascii():
+        return award_id_str.translate(ASCII_NORMALIZATION)
+
+    award_id_ascii = unicodedata.normalize('NFKD', award_id_str)
     award_id_ascii = award_id_ascii.encode('ascii', 'ignore').decode('ascii')
 
-    normalized = re.sub(r'[^A-Za-z0-9]', '', award_id_ascii).upper()
+    normalized = NON_ALNUM_RE.sub('', award_id_ascii).upper()
     return normalized
 
 
+@lru_cache(maxsize=1_000_000)
 def extract_segments(award_id):
     if not award_id:
-        return []
+        return ()
 
-    award_id_clean = str(award_id)
-    for char in ['‐', '–', '—', '−']:
-        award_id_clean = award_id_clean.replace(char, '-')
+    award_id_clean = str(award_id).translate(DASH_TRANSLATION)
 
     award_id_ascii = unicodedata.normalize('NFKD', award_id_clean)
     award_id_ascii = award_id_ascii.encode('ascii', 'ignore').decode('ascii')
 
-    segments = re.split(r'[-_./\s]+', award_id_ascii.strip())
+    segments = SEGMENT_SEPARATOR_RE.split(award_id_ascii.strip())
 
-    return [seg.upper() for seg in segments if seg]
+    return tuple((seg.upper(), int(seg) if seg.isdigit() else None) for seg in segments if seg)
 
 
-def are_segments_compatible(seg1, seg2):
+def are_segments_compatible(segment1, segment2):
+    seg1, num1 = segment1
+    seg2, num2 = segment2
+
     if seg1 == seg2:
         return True
 
-    if seg1.isdigit() and seg2.isdigit():
-        if int(seg1) == int(seg2):
-            return True
-
-        if seg1.lstrip('0') == seg2.lstrip('0'):
+    if num1 is not None and num2 is not None:
+        if num1 == num2:
             return True
 
         if len(seg1) == 4 and len(seg2) == 2:
@@ -51,12 +68,12 @@ def are_segments_compatible(seg1, seg2):
 
         return False
 
-    if seg1.isdigit() != seg2.isdigit():
+    if (num1 is None) != (num2 is None):
         return False
 
     if seg1.startswith(seg2) or seg2.startswith(seg1):
-        seg1_nums = re.findall(r'\d+', seg1)
-        seg2_nums = re.findall(r'\d+', seg2)
+        seg1_nums = DIGITS_RE.findall(seg1)
+        seg2_nums = DIGITS_RE.findall(seg2)
         if seg1_nums and seg2_nums:
             try:
                 if all(int(n1) == int(n2) for n1, n2 in zip(seg1_nums, seg2_nums)):
@@ -64,12 +81,12 @@ def are_segments_compatible(seg1, seg2):
             except:
                 pass
 
-    seg1_alpha = re.sub(r'\d', '', seg1)
-    seg2_alpha = re.sub(r'\d', '', seg2)
+    seg1_alpha = DIGIT_RE.sub('', seg1)
+    seg2_alpha = DIGIT_RE.sub('', seg2)
 
     if seg1_alpha == seg2_alpha:
-        seg1_nums = re.findall(r'\d+', seg1)
-        seg2_nums = re.findall(r'\d+', seg2)
+        seg1_nums = DIGITS_RE.findall(seg1)
+        seg2_nums = DIGITS_RE.findall(seg2)
         if seg1_nums and seg2_nums:
             if seg1_nums[0] != seg2_nums[0]:
                 try:
@@ -100,12 +117,12 @@ def structured_match(id1, id2):
     total_segments = max(len(segments1), len(segments2))
 
     # Try to align segments
-    for i in range(min(len(segments1), len(segments2))):
-        if are_segments_compatible(segments1[i], segments2[i]):
+    for i, (segment1, segment2) in enumerate(zip(segments1, segments2)):
+        if are_segments_compatible(segment1, segment2):
             matched_segments += 1
         else:
             # Check if this is a critical segment (usually numeric identifiers)
-            if segments1[i].isdigit() and segments2[i].isdigit():
+            if segment1[1] is not None and segment2[1] is not None:
                 # Treat different numbers in the same position as different grants
                 # with an exception for fir it's a year difference and other segments match
                 if i == 0 or i == len(segments1) - 1 or i == len(segments2) - 1:
@@ -119,71 +136,14 @@ def structured_match(id1, id2):
 
 
 def levenshtein_distance(s1, s2):
-    if len(s1) < len(s2):
-        return levenshtein_distance(s2, s1)
-
-    if len(s2) == 0:
-        return len(s1)
-
-    previous_row = range(len(s2) + 1)
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            # j+1 instead of j since previous_row and current_row are one character longer than s2
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-
-    return previous_row[-1]
+    return Levenshtein.distance(s1, s2)
 
 
 def calculate_similarity_ratio(s1, s2):
     if not s1 or not s2:
         return 0.0
 
-    return SequenceMatcher(None, s1, s2).ratio()
-
-
-def longest_common_substring_length(s1, s2):
-    if not s1 or not s2:
-        return 0
-
-    m = len(s1)
-    n = len(s2)
-
-    # Table to store lengths of longest common suffixes
-    dp = [[0] * (n + 1) for _ in range(m + 1)]
-    result = 0
-
-    for i in range(m + 1):
-        for j in range(n + 1):
-            if i == 0 or j == 0:
-                dp[i][j] = 0
-            elif s1[i-1] == s2[j-1]:
-                dp[i][j] = dp[i-1][j-1] + 1
-                result = max(result, dp[i][j])
-            else:
-                dp[i][j] = 0
-
-    return result
-
-
-def calculate_overlap_coefficient(s1, s2):
-    if not s1 or not s2:
-        return 0.0
-
-    set1 = set(s1)
-    set2 = set(s2)
-
-    if len(set1) == 0 or len(set2) == 0:
-        return 0.0
-
-    intersection = len(set1 & set2)
-    smaller_set_size = min(len(set1), len(set2))
-
-    return intersection / smaller_set_size
+    return Indel.normalized_similarity(s1, s2)
 
 
 def is_fuzzy_match(s1, s2, threshold: float = 0.90):
@@ -217,8 +177,8 @@ def is_fuzzy_match(s1, s2, threshold: float = 0.90):
     segments1 = extract_segments(s1)
     segments2 = extract_segments(s2)
 
-    numeric_segments1 = sum(1 for seg in segments1 if seg.isdigit())
-    numeric_segments2 = sum(1 for seg in segments2 if seg.isdigit())
+    numeric_segments1 = sum(1 for _, number in segments1 if number is not None)
+    numeric_segments2 = sum(1 for _, number in segments2 if number is not None)
 
     # If both have multiple numeric segments, they're likely structured IDs
     # so skip fuzzy matching
@@ -231,12 +191,15 @@ def is_fuzzy_match(s1, s2, threshold: float = 0.90):
     if min(len_s1, len_s2) <= 3:
         return s1_norm == s2_norm
 
-    similarity_ratio = calculate_similarity_ratio(s1_norm, s2_norm)
-
     if any(c.isdigit() for c in s1_norm) and any(c.isdigit() for c in s2_norm):
-        return similarity_ratio >= 0.95
+        threshold = 0.95
+
+    # The Indel ratio is never below SequenceMatcher's, so it rules out most
+    # pairs cheaply; the match decision itself stays on SequenceMatcher
+    if calculate_similarity_ratio(s1_norm, s2_norm) < threshold - 1e-9:
+        return False
 
-    return similarity_ratio >= threshold
+    return SequenceMatcher(None, s1_norm, s2_norm).ratio() >= threshold
 
 
 def check_substring_match(id1, id2):
@@ -289,6 +252,7 @@ def match_award_ids(id1, id2, match_types = None):
     return False, None
 
 
+@lru_cache(maxsize=200_000)
 def get_similarity_score(id1, id2):
     if id1 is None or id2 is None:
         if id1 is None and id2 is None:
@@ -312,8 +276,8 @@ def get_similarity_score(id1, id2):
 
     segments1 = extract_segments(id1_str)
     segments2 = extract_segments(id2_str)
-    numeric_segments1 = sum(1 for seg in segments1 if seg.isdigit())
-    numeric_segments2 = sum(1 for seg in segments2 if seg.isdigit())
+    numeric_segments1 = sum(1 for _, number in segments1 if number is not None)
+    numeric_segments2 = sum(1 for _, number in segments2 if number is not None)
 
     if numeric_segments1 >= 2 and numeric_segments2 >= 2:
         return structured_confidence
@@ -328,19 +292,18 @@ def get_similarity_score(id1, id2):
     seq_similarity = calculate_similarity_ratio(id1_norm, id2_norm)
     scores.append(seq_similarity)
 
+    # The longest common substring is never longer than the longest common
+    # subsequence behind seq_similarity, so an LCS score can't raise the max
     if id1_norm and id2_norm:
-        edit_dist = levenshtein_distance(id1_norm, id2_norm)
         max_len = max(len(id1_norm), len(id2_norm))
-        edit_score = 1.0 - (edit_dist / max_len)
-        scores.append(edit_score)
-
-    if id1_norm and id2_norm:
-        lcs_len = longest_common_substring_length(id1_norm, id2_norm)
-        avg_len = (len(id1_norm) + len(id2_norm)) / 2
-        lcs_score = lcs_len / avg_len
-        scores.append(lcs_score)
-
-    max_score = max(scores) if scores else 0.0
+        # Edit distance is at least the length difference
+        edit_score_bound = 1.0 - abs(len(id1_norm) - len(id2_norm)) / max_len
+        if edit_score_bound > max(scores):
+            edit_dist = levenshtein_distance(id1_norm, id2_norm)
+            edit_score = 1.0 - (edit_dist / max_len)
+            scores.append(edit_score)
+
+    max_score = max(scores)
 
     if structured_confidence > 0:
         max_score = min(max_score, structured_confidence + 0.1)